@@ -1,21 +1,165 @@
 from __future__ import annotations
 
+import os
+import re
 import socket
-from typing import Dict, Optional, List, Tuple, Generator
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Deque, Dict, Optional, List, Tuple, Iterator
 
 import docker
 from docker import DockerClient
+from docker.errors import DockerException, ImageNotFound, NotFound
 from docker.models.containers import Container
-# intentionally no specific docker.errors import to avoid unused warnings
 
 MANAGED_LABEL = "dockapi.managed"
 NAME_LABEL = "dockapi.name"
-PORT_LABEL = "dockapi.container_port"
+PORT_LABEL = "dockapi.container_port"  # value: port-map key, e.g. "80/tcp"
+# Image reference as requested at run time: /containers/json reports the
+# image id instead once the tag has moved, inspect reports Config.Image
+IMAGE_LABEL = "dockapi.image"
+_MANAGED_FILTER = {"label": [MANAGED_LABEL]}
+_BASE_LABELS = {MANAGED_LABEL: "true"}
+
+# host:container[:mode], where host may start with a Windows drive letter
+_VOLUME_RE = re.compile(r"^((?:[A-Za-z]:)?[^:]+):([^:]+)(?::([^:]*))?$")
+
+# Worker threads for short daemon calls (inspect, list, start, ping) made
+# from the async API; defaults to ThreadPoolExecutor's own sizing
+DOCKER_EXECUTOR_WORKERS = int(
+    os.getenv(
+        "DOCKAPI_DOCKER_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))
+    )
+)
+
+# Separate worker threads for calls that may block for seconds or minutes
+# (pulls, run and port wait, stop, exec), so they cannot starve the above
+DOCKER_SLOW_EXECUTOR_WORKERS = int(
+    os.getenv("DOCKAPI_DOCKER_SLOW_WORKERS", "16")
+)
+
+# Connections kept per pool to the Docker daemon: one per executor worker
+# plus as many again for followed log streams, which hold one each
+DOCKER_MAX_POOL_SIZE = (
+    DOCKER_EXECUTOR_WORKERS + DOCKER_SLOW_EXECUTOR_WORKERS
+) * 2
+
+# Short-lived cache of container_info() results for the proxy hot path
+INFO_CACHE_TTL = 2.0
+INFO_CACHE_MAXSIZE = 1024
+
+# How long entries from the last container listing answer detail lookups
+SNAPSHOT_TTL = 0.5
+
+# How long a finished pull answers repeat pulls of the same reference,
+# and how long a known tag -> id mapping is trusted when staleness is fine
+# (each map holds at most IMAGE_CACHE_MAXSIZE references)
+PULL_CACHE_TTL = 10.0
+TAG_ID_CACHE_TTL = 60.0
+IMAGE_CACHE_MAXSIZE = 512
+
+# Pre-bound sockets kept ready for auto-assigned host ports
+PORT_POOL_SIZE = 8
+
+# Network modes under which a container cannot publish ports (besides
+# "container:<id>", which shares another container's stack)
+_UNPUBLISHED_NETWORK_MODES = frozenset({"host", "none"})
+
+
+def _managed_filter(extra: Optional[Dict] = None) -> Dict:
+    """Daemon-side filter for managed containers, plus any extra filters."""
+    if not extra:
+        return _MANAGED_FILTER
+    merged: Dict[str, List[str]] = {
+        k: list(v) if isinstance(v, (list, tuple)) else [v]
+        for k, v in extra.items()
+    }
+    merged["label"] = [MANAGED_LABEL, *merged.get("label", [])]
+    return merged
+
+
+def _ttl_get(cache: Dict[str, Tuple[float, Any]], key: str, now: float):
+    entry = cache.get(key)
+    if entry and entry[0] > now:
+        return entry[1]
+    return None
+
+
+def _ttl_put(
+    cache: Dict[str, Tuple[float, Any]],
+    key: str,
+    value: Any,
+    expires: float,
+    maxsize: int,
+) -> None:
+    if len(cache) >= maxsize:
+        now = time.monotonic()
+        for k in [k for k, (exp, _) in cache.items() if exp <= now]:
+            del cache[k]
+    if len(cache) >= maxsize:
+        # still full: drop the oldest insertion
+        cache.pop(next(iter(cache)))
+    cache[key] = (expires, value)
+
+
+@lru_cache(maxsize=1024)
+def _tcp_key(port: int) -> str:
+    """Docker's port map key for a TCP port, e.g. 80 -> "80/tcp"."""
+    return f"{port}/tcp"
+
+
+def _label_port_key(labels: Dict[str, str]) -> Optional[str]:
+    """The "<port>/tcp" key stored in PORT_LABEL, if any."""
+    value = labels.get(PORT_LABEL)
+    if not value:
+        return None
+    if value.endswith("/tcp"):
+        return value if value[:-4].isdigit() else None
+    # containers labelled before the "/tcp" form carry the bare port
+    return _tcp_key(int(value)) if value.isdigit() else None
+
+
+@lru_cache(maxsize=None)
+def _restart_policy(name: Optional[str]) -> Optional[Dict[str, str]]:
+    # Shared per policy name; docker-py only serializes it
+    return {"Name": name} if name else None
 
 
 class DockerService:
+    """Process-wide facade over one Docker client.
+
+    Create a single instance and share it: the client's connection pool
+    and the caches below are safe to use from many threads at once.
+    """
+
     def __init__(self) -> None:
-        self.client: DockerClient = docker.from_env()
+        self.client: DockerClient = docker.from_env(
+            max_pool_size=DOCKER_MAX_POOL_SIZE
+        )
+        self._info_cache: Dict[str, Tuple[float, Dict]] = {}
+        self._snapshots: Dict[str, Tuple[float, Dict]] = {}
+        self._cache_lock = threading.Lock()
+        # image reference -> [lock, callers holding or waiting on it]
+        self._pull_locks: Dict[str, List] = {}
+        self._pull_locks_guard = threading.Lock()
+        # image reference -> (expires, image id), set by real pulls only
+        self._pulled: Dict[str, Tuple[float, str]] = {}
+        # image reference -> (expires, image id), set by pulls and by the
+        # run path's local inspect
+        self._tag_ids: Dict[str, Tuple[float, str]] = {}
+        self._port_pool: Deque[socket.socket] = deque()
+        self._port_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(
+            max_workers=DOCKER_EXECUTOR_WORKERS,
+            thread_name_prefix="docker",
+        )
+        self.slow_executor = ThreadPoolExecutor(
+            max_workers=DOCKER_SLOW_EXECUTOR_WORKERS,
+            thread_name_prefix="docker-slow",
+        )
 
     def ping(self) -> bool:
         self.client.ping()
@@ -23,31 +167,120 @@ class DockerService:
 
     # Images
     def list_images(self) -> List[Dict]:
-        images = self.client.images.list()
-        result: List[Dict] = []
-        for img in images:
-            result.append(
-                {
-                    "id": img.short_id.replace("sha256:", ""),
-                    "repo_tags": img.tags or [],
-                    "size": getattr(img, "attrs", {}).get("Size", 0),
-                }
+        # Raw image summaries; "sha256:" + 10 hex chars matches the
+        # short_id this endpoint has always returned
+        return [
+            {
+                "id": d["Id"][7:17],
+                "repo_tags": [
+                    t for t in d.get("RepoTags") or [] if t != "<none>:<none>"
+                ],
+                "size": d.get("Size", 0),
+            }
+            for d in self.client.api.images()
+        ]
+
+    def pull_image(self, image: str, allow_cached: bool = False) -> str:
+        """Pull an image, collapsing concurrent and repeated pulls into one.
+
+        With allow_cached, an id learned within TAG_ID_CACHE_TTL is returned
+        without contacting the daemon or the registry.
+        """
+        cached = self._cached_image_id(image, allow_cached)
+        if cached:
+            return cached
+        with self._pull_locks_guard:
+            entry = self._pull_locks.setdefault(image, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                # another caller may have completed the same pull meanwhile
+                cached = self._cached_image_id(image, allow_cached)
+                if cached:
+                    return cached
+                for event in self.pull_image_stream(image):
+                    if "error" in event:
+                        raise DockerException(event["error"])
+                image_id = self.client.api.inspect_image(image)["Id"]
+                self._remember_image_id(image, image_id, pulled=True)
+                return image_id
+        finally:
+            # drop the lock once nobody else is waiting, so one-off image
+            # references do not accumulate
+            with self._pull_locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._pull_locks[image]
+
+    def pull_image_stream(self, image: str) -> Iterator[Dict]:
+        """Start a pull and return its decoded progress events."""
+        return self.client.api.pull(image, stream=True, decode=True)
+
+    def _ensure_image(self, image: str) -> None:
+        if self._cached_image_id(image, allow_cached=True):
+            return
+        try:
+            image_id = self.client.api.inspect_image(image)["Id"]
+        except ImageNotFound:
+            self.pull_image(image)
+            return
+        self._remember_image_id(image, image_id, pulled=False)
+
+    def _remember_image_id(
+        self, image: str, image_id: str, pulled: bool
+    ) -> None:
+        now = time.monotonic()
+        with self._cache_lock:
+            if pulled:
+                _ttl_put(
+                    self._pulled,
+                    image,
+                    image_id,
+                    now + PULL_CACHE_TTL,
+                    IMAGE_CACHE_MAXSIZE,
+                )
+            _ttl_put(
+                self._tag_ids,
+                image,
+                image_id,
+                now + TAG_ID_CACHE_TTL,
+                IMAGE_CACHE_MAXSIZE,
             )
-        return result
 
-    def pull_image(self, image: str) -> str:
-        img = self.client.images.pull(image)
-        return img.id
+    def _cached_image_id(
+        self, image: str, allow_cached: bool
+    ) -> Optional[str]:
+        # Only real pulls satisfy the short dedup window; ids merely seen
+        # locally (the run path's inspect) answer allow_cached callers only
+        cache = self._tag_ids if allow_cached else self._pulled
+        with self._cache_lock:
+            return _ttl_get(cache, image, time.monotonic())
 
     # Containers
-    def _find_container(self, container_id_or_name: str) -> Container:
-        return self.client.containers.get(container_id_or_name)
+    def _find_container(self, container_id_or_name: str) -> Dict:
+        # Raw inspect payload; no Container wrapper or lazy reloads
+        return self.client.api.inspect_container(container_id_or_name)
 
-    def _reserve_port(self) -> int:
+    def _bind_free_port(self) -> socket.socket:
         # Bind to port 0 to let OS choose a free port
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
             s.bind(("127.0.0.1", 0))
-            return s.getsockname()[1]
+        except OSError:
+            s.close()
+            raise
+        return s
+
+    def _reserve_port(self) -> int:
+        # Ports in the pool stay bound until handed out, so nothing else
+        # on the host can take them in the meantime
+        with self._port_lock:
+            while len(self._port_pool) < PORT_POOL_SIZE:
+                self._port_pool.append(self._bind_free_port())
+            s = self._port_pool.popleft()
+        port = s.getsockname()[1]
+        s.close()
+        return port
 
     def run_container(
         self,
@@ -64,11 +297,18 @@ class DockerService:
         volumes: Optional[List[str]] = None,
         network: Optional[str] = None,
     ) -> Tuple[str, int]:
+        # Pull explicitly (and deduplicated) rather than letting
+        # containers.run fall back to its own implicit pull; done before
+        # picking a host port so a slow pull cannot widen the window in
+        # which the released port may be taken by someone else
+        self._ensure_image(image)
+
         if host_port is None or int(host_port) == 0:
             host_port = self._reserve_port()
 
-        ports = {f"{container_port}/tcp": host_port}
-        labels = {MANAGED_LABEL: "true", PORT_LABEL: str(container_port)}
+        port_key = _tcp_key(container_port)
+        ports = {port_key: host_port}
+        labels = {**_BASE_LABELS, PORT_LABEL: port_key, IMAGE_LABEL: image}
         if name:
             labels[NAME_LABEL] = name
 
@@ -78,74 +318,180 @@ class DockerService:
         container: Container = self.client.containers.run(
             image=image,
             command=command,
-            environment=env or {},
+            environment=env or None,
             name=name,
             ports=ports,
             detach=detach,
             auto_remove=auto_remove,
             labels=labels,
-            restart_policy=(
-                {"Name": restart_policy} if restart_policy else None
-            ),
+            restart_policy=_restart_policy(restart_policy),
             volumes=vol_spec,
             network=network,
         )
+        self._invalidate(container.id)
+        if name:
+            self._invalidate(name)
         return container.id, int(host_port)
 
-    def list_containers(self, all_: bool = False) -> List[Dict]:
-        containers = self.client.containers.list(
-            all=all_, filters={"label": MANAGED_LABEL}
+    def wait_for_port(
+        self, container_id: str, container_port: int, timeout: float = 5.0
+    ) -> bool:
+        """Poll inspect with backoff until the port binding is published.
+
+        Returns False at once if the container is not running or its
+        network mode can never publish ports.
+        """
+        key = _tcp_key(container_port)
+        deadline = time.monotonic() + timeout
+        delay = 0.02
+        while True:
+            attrs = self.client.api.inspect_container(container_id)
+            ports_map = attrs.get("NetworkSettings", {}).get("Ports") or {}
+            if ports_map.get(key):
+                return True
+            if not attrs.get("State", {}).get("Running", True):
+                return False
+            mode = attrs.get("HostConfig", {}).get("NetworkMode") or ""
+            if mode in _UNPUBLISHED_NETWORK_MODES or mode.startswith(
+                "container:"
+            ):
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.2)
+
+    def list_containers(
+        self, all_: bool = False, filters: Optional[Dict] = None
+    ) -> List[Dict]:
+        # Low-level list returns summaries in one call, with no
+        # per-container inspect or Container wrapper
+        summaries = self.client.api.containers(
+            all=all_, filters=_managed_filter(filters)
         )
-        result: List[Dict] = []
-        for c in containers:
-            info = self._container_info(c)
-            result.append(info)
-        return result
+        infos = [self._container_info_from_summary(s) for s in summaries]
+        # Keep a brief snapshot so a list -> detail click-through is free
+        expires = time.monotonic() + SNAPSHOT_TTL
+        with self._cache_lock:
+            for info in infos:
+                if str(info["image"]).startswith("sha256:"):
+                    # unlabelled and retagged: let detail inspect instead
+                    continue
+                _ttl_put(
+                    self._snapshots,
+                    info["id"],
+                    info,
+                    expires,
+                    INFO_CACHE_MAXSIZE,
+                )
+        return infos
 
     def container_info(self, container_id: str) -> Dict:
-        c = self._find_container(container_id)
-        return self._container_info(c)
+        with self._cache_lock:
+            info = _ttl_get(self._snapshots, container_id, time.monotonic())
+        if info is not None:
+            return info
+        attrs = self._find_container(container_id)
+        labels = (attrs.get("Config") or {}).get("Labels") or {}
+        if labels.get(MANAGED_LABEL) != "true":
+            raise NotFound(
+                f"Container {container_id} is not managed by dockAPI"
+            )
+        return self._container_info_from_attrs(attrs)
 
-    def _container_info(self, c: Container) -> Dict:
-        c.reload()
-        attrs = c.attrs
-        container_port = None
-        try:
-            container_port = (
-                int(c.labels.get(PORT_LABEL))
-                if c.labels.get(PORT_LABEL)
-                else None
+    def container_info_cached(self, container_id: str) -> Dict:
+        """Like container_info() but served from a short TTL cache."""
+        now = time.monotonic()
+        with self._cache_lock:
+            info = _ttl_get(self._info_cache, container_id, now)
+        if info is not None:
+            return info
+        info = self.container_info(container_id)
+        with self._cache_lock:
+            _ttl_put(
+                self._info_cache,
+                container_id,
+                info,
+                now + INFO_CACHE_TTL,
+                INFO_CACHE_MAXSIZE,
             )
-        except Exception:
-            container_port = None
+        return info
+
+    def _invalidate(self, container_id: str) -> None:
+        # Entries may be keyed by full id, short id or name
+        with self._cache_lock:
+            for cache in (self._info_cache, self._snapshots):
+                stale = [
+                    k
+                    for k, (_, info) in cache.items()
+                    if k == container_id
+                    or info.get("name") == container_id
+                    or str(info.get("id", "")).startswith(container_id)
+                ]
+                for k in stale:
+                    del cache[k]
+
+    def _container_info_from_summary(self, raw: Dict) -> Dict:
+        labels = raw.get("Labels") or {}
+        key = _label_port_key(labels)
+        container_port = int(key[:-4]) if key else None
         host_port = None
         if container_port:
-            key = f"{container_port}/tcp"
-            ports_map = attrs.get("NetworkSettings", {}).get("Ports", {})
-            bindings = ports_map.get(key)
-            if bindings:
-                host_port = int(bindings[0].get("HostPort"))
+            for p in raw.get("Ports") or []:
+                if (
+                    p.get("PrivatePort") == container_port
+                    and p.get("Type") == "tcp"
+                    and p.get("PublicPort")
+                ):
+                    host_port = int(p["PublicPort"])
+                    break
+        names = raw.get("Names") or []
+        return {
+            "id": raw["Id"],
+            "name": names[0].lstrip("/") if names else None,
+            "image": labels.get(IMAGE_LABEL) or raw.get("Image"),
+            "status": raw.get("State"),
+            "labels": labels,
+            "host_port": host_port,
+            "container_port": container_port,
+        }
+
+    def _container_info_from_attrs(self, attrs: Dict) -> Dict:
+        config = attrs.get("Config") or {}
+        labels = config.get("Labels") or {}
+        key = _label_port_key(labels)
+        host_port = None
+        if key:
+            try:
+                host_port = int(
+                    attrs["NetworkSettings"]["Ports"][key][0]["HostPort"]
+                )
+            except (KeyError, TypeError, IndexError):
+                # not published (yet), or the container is stopped
+                host_port = None
+        container_port = int(key[:-4]) if key else None
         return {
-            "id": c.id,
-            "name": c.name,
-            "image": attrs.get("Config", {}).get("Image"),
-            "status": c.status,
-            "labels": c.labels or {},
+            "id": attrs["Id"],
+            "name": (attrs.get("Name") or "").lstrip("/") or None,
+            "image": labels.get(IMAGE_LABEL) or config.get("Image"),
+            "status": (attrs.get("State") or {}).get("Status"),
+            "labels": labels,
             "host_port": host_port,
             "container_port": container_port,
         }
 
     def start(self, container_id: str) -> None:
-        c = self._find_container(container_id)
-        c.start()
+        self.client.api.start(container_id)
+        self._invalidate(container_id)
 
     def stop(self, container_id: str, timeout: int = 10) -> None:
-        c = self._find_container(container_id)
-        c.stop(timeout=timeout)
+        self.client.api.stop(container_id, timeout=timeout)
+        self._invalidate(container_id)
 
     def remove(self, container_id: str, force: bool = False) -> None:
-        c = self._find_container(container_id)
-        c.remove(force=force)
+        self.client.api.remove_container(container_id, force=force)
+        self._invalidate(container_id)
 
     # Helpers
     def _parse_volumes(
@@ -161,16 +507,11 @@ class DockerService:
         """
         result: Dict[str, Dict[str, str]] = {}
         for item in volumes:
-            # Split from the right to better support Windows drive letters like C:\
-            parts = item.rsplit(":", maxsplit=2)
-            if len(parts) < 2:
+            m = _VOLUME_RE.match(item)
+            if not m:
                 # skip invalid, but keep going
                 continue
-            if len(parts) == 2:
-                host, cont = parts
-                mode = "rw"
-            else:
-                host, cont, mode = parts
+            host, cont, mode = m.group(1), m.group(2), m.group(3)
             mode = (mode or "rw").lower()
             if mode not in {"ro", "rw"}:
                 mode = "rw"
@@ -184,18 +525,12 @@ class DockerService:
         *,
         tail: Optional[int] = None,
         follow: bool = False,
-    ) -> Generator[bytes, None, None] | bytes:
-        c = self._find_container(container_id)
+    ) -> Iterator[bytes] | bytes:
         if follow:
-            stream = c.logs(stream=True, tail=tail)
-
-            def _gen() -> Generator[bytes, None, None]:
-                for chunk in stream:
-                    yield chunk
-
-            return _gen()
+            # docker-py's CancellableStream; close() unblocks a pending read
+            return self.client.api.logs(container_id, stream=True, tail=tail)
         else:
-            return c.logs(stream=False, tail=tail)
+            return self.client.api.logs(container_id, stream=False, tail=tail)
 
     # Exec
     def exec(
@@ -207,19 +542,20 @@ class DockerService:
         env: Optional[Dict[str, str]] = None,
         tty: bool = False,
     ) -> Tuple[int, str, Optional[str]]:
-        c = self._find_container(container_id)
-        res = c.exec_run(
-            cmd=command,
-            workdir=workdir,
-            environment=env,
+        api = self.client.api
+        exec_id = api.exec_create(
+            container_id,
+            command,
             tty=tty,
-            demux=True,  # returns (stdout, stderr)
-        )
-        exit_code = res.exit_code if hasattr(res, "exit_code") else 0
+            environment=env,
+            workdir=workdir,
+        )["Id"]
+        output = api.exec_start(exec_id, tty=tty, demux=True)
         stdout, stderr = (
-            res.output if isinstance(res.output, tuple) else (res.output, None)
+            output if isinstance(output, tuple) else (output, None)
         )
-        # Ensure str output
+        # Decode only non-empty streams; an empty stderr is reported as None
         out_str = stdout.decode("utf-8", errors="replace") if stdout else ""
         err_str = stderr.decode("utf-8", errors="replace") if stderr else None
+        exit_code = api.exec_inspect(exec_id)["ExitCode"]
         return exit_code, out_str, err_str
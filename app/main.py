@@ -1,13 +1,30 @@
 from __future__ import annotations
 
 import asyncio
-from typing import List, Optional
-from urllib.parse import urljoin
+import gzip
+import json
+import os
+import threading
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
 
 import httpx
+from docker.errors import NotFound
 from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.responses import JSONResponse, StreamingResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from .docker_service import DockerService
 from .models import (
@@ -21,7 +38,70 @@ from .models import (
     ExecResponse,
 )
 
-app = FastAPI(title="dockAPI", version="0.1.0")
+
+class _SelectiveGZipMiddleware:
+    """GZip buffered API responses; pass streamed responses through as-is.
+
+    Starlette's GZipResponder never flushes, so any streamed body (proxied
+    upstream bytes, followed logs, image pull progress) would be held back
+    until it ended. A response counts as streamed when its first body
+    message has more_body set, which is how StreamingResponse sends every
+    chunk; only single-message bodies are compressed.
+    """
+
+    def __init__(
+        self, app: ASGIApp, minimum_size: int = 1024, compresslevel: int = 9
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or "gzip" not in Headers(scope=scope).get(
+            "accept-encoding", ""
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        decided = False
+
+        async def _send(message: Message) -> None:
+            nonlocal start, decided
+            if decided:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            decided = True
+            assert start is not None
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (
+                message["type"] != "http.response.body"
+                or message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+            ):
+                await send(start)
+                await send(message)
+                return
+            body = gzip.compress(body, compresslevel=self.compresslevel)
+            headers["Content-Encoding"] = "gzip"
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, _send)
+
+
+app = FastAPI(
+    title="dockAPI",
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
+)
 
 # CORS for convenience during dev
 app.add_middleware(
@@ -32,13 +112,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger JSON responses such as GET /containers and /images
+app.add_middleware(_SelectiveGZipMiddleware, minimum_size=1024)
+
 docker_service = DockerService()
 
+# Upper bound on concurrently proxied requests, and how long a request may
+# wait for a slot before being rejected with 503
+PROXY_MAX_INFLIGHT = int(os.getenv("DOCKAPI_MAX_PROXY_INFLIGHT", "200"))
+PROXY_ACQUIRE_TIMEOUT = 5.0
+
+
+async def _docker_call(fn: Callable[..., Any], *args: Any, **kwargs: Any):
+    """Run a short blocking DockerService call on its dedicated executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        docker_service.executor, partial(fn, *args, **kwargs)
+    )
+
+
+async def _docker_slow_call(
+    fn: Callable[..., Any], *args: Any, **kwargs: Any
+):
+    """Like _docker_call, for calls that may block for seconds or more."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        docker_service.slow_executor, partial(fn, *args, **kwargs)
+    )
+
+
+@app.on_event("startup")
+async def _startup() -> None:
+    # One pooled client for the app lifetime so upstream connections
+    # to published container ports stay keep-alive across requests.
+    app.state.http = httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=60,
+        limits=httpx.Limits(
+            max_connections=500, max_keepalive_connections=100
+        ),
+    )
+    app.state.proxy_sem = asyncio.Semaphore(PROXY_MAX_INFLIGHT)
+
+
+@app.on_event("shutdown")
+async def _shutdown() -> None:
+    await app.state.http.aclose()
+    docker_service.executor.shutdown(wait=False)
+    docker_service.slow_executor.shutdown(wait=False)
+
 
 @app.get("/healthz")
 async def healthz() -> dict:
     try:
-        docker_service.ping()
+        await _docker_call(docker_service.ping)
         return {"ok": True}
     except Exception as e:  # pragma: no cover
         raise HTTPException(status_code=500, detail=str(e))
@@ -46,15 +173,31 @@ async def healthz() -> dict:
 
 # Images
 @app.get("/images", response_model=List[ImageInfo])
-async def list_images() -> List[ImageInfo]:
-    images = docker_service.list_images()
-    return [ImageInfo(**i) for i in images]
+async def list_images() -> List[dict]:
+    # raw dicts; response_model validates them once
+    return await _docker_call(docker_service.list_images)
 
 
 @app.post("/images/pull")
-async def pull_image(payload: PullImageRequest) -> dict:
+async def pull_image(payload: PullImageRequest, stream: bool = False):
     try:
-        image_id = docker_service.pull_image(payload.image)
+        if stream:
+            events = await _docker_call(
+                docker_service.pull_image_stream, payload.image
+            )
+
+            async def streamer():
+                async for event in _bridge_sync_iter(events):
+                    yield json.dumps(event).encode("utf-8") + b"\n"
+
+            return StreamingResponse(
+                streamer(), media_type="application/x-ndjson"
+            )
+        image_id = await _docker_slow_call(
+            docker_service.pull_image,
+            payload.image,
+            allow_cached=payload.allow_cached,
+        )
         return {"id": image_id}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -62,15 +205,15 @@ async def pull_image(payload: PullImageRequest) -> dict:
 
 # Containers
 @app.get("/containers", response_model=List[ContainerInfo])
-async def list_containers() -> List[ContainerInfo]:
-    cs = docker_service.list_containers(all_=True)
-    return [ContainerInfo(**c) for c in cs]
+async def list_containers() -> List[dict]:
+    return await _docker_call(docker_service.list_containers, all_=True)
 
 
 @app.post("/containers/run", response_model=ContainerInfo)
 async def run_container(payload: RunContainerRequest) -> ContainerInfo:
     try:
-        cid, host_port = docker_service.run_container(
+        cid, host_port = await _docker_slow_call(
+            docker_service.run_container,
             image=payload.image,
             container_port=payload.container_port,
             host_port=payload.host_port,
@@ -84,13 +227,15 @@ async def run_container(payload: RunContainerRequest) -> ContainerInfo:
             network=payload.network,
         )
 
-        # small wait to ensure network ready
-        await asyncio.sleep(0.3)
+        # wait until the daemon has published the port binding
+        await _docker_slow_call(
+            docker_service.wait_for_port, cid, payload.container_port
+        )
         if payload.wait_ready and payload.health_path:
             await _wait_ready(
                 host_port, payload.health_path, payload.wait_timeout
             )
-        info = docker_service.container_info(cid)
+        info = await _docker_call(docker_service.container_info, cid)
         return ContainerInfo(**info)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -99,7 +244,9 @@ async def run_container(payload: RunContainerRequest) -> ContainerInfo:
 @app.get("/containers/{container_id}", response_model=ContainerInfo)
 async def get_container(container_id: str) -> ContainerInfo:
     try:
-        info = docker_service.container_info(container_id)
+        info = await _docker_call(
+            docker_service.container_info, container_id
+        )
         return ContainerInfo(**info)
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -108,7 +255,7 @@ async def get_container(container_id: str) -> ContainerInfo:
 @app.post("/containers/{container_id}/stop", response_model=StartStopResponse)
 async def stop_container(container_id: str) -> StartStopResponse:
     try:
-        docker_service.stop(container_id)
+        await _docker_slow_call(docker_service.stop, container_id)
         return StartStopResponse(id=container_id, status="stopped")
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -117,7 +264,7 @@ async def stop_container(container_id: str) -> StartStopResponse:
 @app.post("/containers/{container_id}/start", response_model=StartStopResponse)
 async def start_container(container_id: str) -> StartStopResponse:
     try:
-        docker_service.start(container_id)
+        await _docker_call(docker_service.start, container_id)
         return StartStopResponse(id=container_id, status="running")
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -126,28 +273,85 @@ async def start_container(container_id: str) -> StartStopResponse:
 @app.delete("/containers/{container_id}")
 async def delete_container(container_id: str, force: bool = False) -> dict:
     try:
-        docker_service.remove(container_id, force=force)
+        await _docker_call(
+            docker_service.remove, container_id, force=force
+        )
         return {"id": container_id, "removed": True}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+_STREAM_END = object()
+
+# Chunks buffered between a blocking stream and a slow client before the
+# pump thread waits (backpressure instead of unbounded memory)
+_BRIDGE_QUEUE_SIZE = 64
+
+
+async def _bridge_sync_iter(
+    sync_iter: Iterable[bytes],
+) -> AsyncIterator[bytes]:
+    """Drain a blocking iterator on one background thread via a queue."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    # Backpressure without a per-chunk round trip to the loop: the pump
+    # takes a slot per chunk, the consumer gives it back once dequeued
+    slots = threading.BoundedSemaphore(_BRIDGE_QUEUE_SIZE)
+    stop = threading.Event()
+
+    def _put(item: object) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:  # loop already closed
+            stop.set()
+
+    def _pump() -> None:
+        try:
+            for chunk in sync_iter:
+                # timeout so a consumer that went away is noticed
+                while not stop.is_set() and not slots.acquire(timeout=0.1):
+                    pass
+                if stop.is_set():
+                    break
+                _put(chunk)
+        except Exception as e:
+            _put(e)
+        finally:
+            _put(_STREAM_END)
+
+    threading.Thread(target=_pump, daemon=True).start()
+    try:
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            slots.release()
+            yield item  # type: ignore[misc]
+    finally:
+        # Client went away or stream ended: stop the pump thread
+        stop.set()
+        close = getattr(sync_iter, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+
 @app.get("/containers/{container_id}/logs")
 async def container_logs(
     container_id: str, tail: Optional[int] = 200, follow: bool = False
 ):
     try:
         if follow:
-            gen = docker_service.get_logs(container_id, tail=tail, follow=True)
+            gen = await _docker_call(
+                docker_service.get_logs, container_id, tail=tail, follow=True
+            )
 
             async def streamer():
-                # Bridge sync generator from docker API to async without blocking the event loop
-                iterator = iter(gen)  # type: ignore
-                while True:
-                    try:
-                        chunk = await asyncio.to_thread(next, iterator)
-                    except StopIteration:
-                        break
+                async for chunk in _bridge_sync_iter(gen):  # type: ignore
                     data = (
                         chunk
                         if isinstance(chunk, (bytes, bytearray))
@@ -157,7 +361,8 @@ async def container_logs(
 
             return StreamingResponse(streamer(), media_type="text/plain")
         else:
-            data = docker_service.get_logs(
+            data = await _docker_call(
+                docker_service.get_logs,
                 container_id, tail=tail, follow=False
             )
             if isinstance(data, (bytes, bytearray)):
@@ -174,7 +379,8 @@ async def exec_in_container(
     container_id: str, payload: ExecRequest
 ) -> ExecResponse:
     try:
-        code, out, err = docker_service.exec(
+        code, out, err = await _docker_slow_call(
+            docker_service.exec,
             container_id,
             payload.command,
             workdir=payload.workdir,
@@ -199,28 +405,57 @@ _ALLOWED_METHODS = [
 ]
 
 
-def _filter_headers(headers: httpx.Headers) -> dict:
-    hop_by_hop = {
-        "connection",
-        "proxy-connection",
-        "keep-alive",
-        "transfer-encoding",
-        "te",
-        "trailer",
-        "upgrade",
-        "host",
+_HOP_BY_HOP = frozenset(
+    {
+        b"connection",
+        b"proxy-connection",
+        b"keep-alive",
+        b"transfer-encoding",
+        b"te",
+        b"trailer",
+        b"upgrade",
+        b"host",
     }
-    return {k: v for k, v in headers.items() if k.lower() not in hop_by_hop}
+)
 
 
-@app.get("/proxy/{container_id}", response_model=ProxyInfo)
-async def proxy_info(container_id: str) -> ProxyInfo:
-    info = docker_service.container_info(container_id)
+def _filter_headers(headers: httpx.Headers) -> List[Tuple[bytes, bytes]]:
+    # Works on the raw byte pairs so repeated headers (e.g. Set-Cookie)
+    # survive and no intermediate dict is built.
+    result = []
+    for k, v in headers.raw:
+        k = k.lower()
+        if k not in _HOP_BY_HOP:
+            result.append((k, v))
+    return result
+
+
+def _has_body(request: Request) -> bool:
+    # Avoid sending a chunked empty body upstream for GET/OPTIONS and friends
+    headers = request.headers
+    if "transfer-encoding" in headers:
+        return True
+    return headers.get("content-length", "0") not in ("", "0")
+
+
+async def _upstream_port(container_id: str) -> int:
+    try:
+        info = await _docker_call(
+            docker_service.container_info_cached, container_id
+        )
+    except NotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
     host_port = info.get("host_port")
     if not host_port:
         raise HTTPException(
             status_code=400, detail="Container has no published port"
         )
+    return host_port
+
+
+@app.get("/proxy/{container_id}", response_model=ProxyInfo)
+async def proxy_info(container_id: str) -> ProxyInfo:
+    host_port = await _upstream_port(container_id)
     return ProxyInfo(
         container_id=container_id,
         upstream=f"http://127.0.0.1:{host_port}",
@@ -229,43 +464,84 @@ async def proxy_info(container_id: str) -> ProxyInfo:
 
 @app.api_route("/proxy/{container_id}/{path:path}", methods=_ALLOWED_METHODS)
 async def proxy(container_id: str, path: str, request: Request) -> Response:
-    info = docker_service.container_info(container_id)
-    host_port = info.get("host_port")
-    if not host_port:
-        raise HTTPException(
-            status_code=400, detail="Container has no published port"
+    host_port = await _upstream_port(container_id)
+
+    url = f"http://127.0.0.1:{host_port}/{path.lstrip('/')}"
+
+    sem: asyncio.Semaphore = request.app.state.proxy_sem
+    try:
+        await asyncio.wait_for(sem.acquire(), PROXY_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Too many in-flight proxy requests"},
         )
 
-    upstream = f"http://127.0.0.1:{host_port}/"  # ensure trailing slash
-    url = urljoin(upstream, path)
+    released = False
 
-    async with httpx.AsyncClient(follow_redirects=True, timeout=60) as client:
-        try:
-            req_headers = _filter_headers(request.headers)
-            body = await request.body()
-            method = request.method.upper()
-
-            upstream_resp = await client.request(
-                method,
-                url,
-                params=request.query_params,
-                content=body,
-                headers=req_headers,
-            )
+    def _release() -> None:
+        nonlocal released
+        if not released:
+            released = True
+            sem.release()
 
-        except httpx.HTTPError as e:
-            return JSONResponse(status_code=502, content={"detail": str(e)})
+    client: httpx.AsyncClient = request.app.state.http
+    try:
+        req_headers = _filter_headers(request.headers)
+        method = request.method.upper()
+
+        # Pipe the inbound body straight through; httpx keeps the client's
+        # Content-Length or falls back to chunked encoding.
+        content = request.stream() if _has_body(request) else None
+
+        upstream_req = client.build_request(
+            method,
+            url,
+            params=request.query_params,
+            content=content,
+            headers=req_headers,
+        )
+        # Relay redirects to the client rather than following them: a
+        # streamed request body cannot be replayed to the new location
+        upstream_resp = await client.send(
+            upstream_req, stream=True, follow_redirects=False
+        )
 
-    # Build response
-    resp_headers = _filter_headers(upstream_resp.headers)
+    except (httpx.HTTPError, httpx.StreamError) as e:
+        _release()
+        return JSONResponse(status_code=502, content={"detail": str(e)})
+    except BaseException:
+        _release()
+        raise
+
+    async def _body() -> AsyncIterator[bytes]:
+        # Close upstream and free the slot however the relay ends,
+        # including an upstream that fails mid-body (Starlette skips
+        # background tasks when the body iterator raises).
+        try:
+            async for chunk in upstream_resp.aiter_raw():
+                yield chunk
+        finally:
+            try:
+                await upstream_resp.aclose()
+            finally:
+                _release()
 
-    # Stream if possible
-    return Response(
-        content=upstream_resp.content,
+    async def _finish() -> None:
+        # Safety net for a client that disconnects before the body
+        # generator is ever started, so its finally never runs.
+        try:
+            await upstream_resp.aclose()
+        finally:
+            _release()
+
+    response = StreamingResponse(
+        _body(),
         status_code=upstream_resp.status_code,
-        headers=resp_headers,
-        media_type=upstream_resp.headers.get("content-type"),
+        background=BackgroundTask(_finish),
     )
+    response.raw_headers = _filter_headers(upstream_resp.headers)
+    return response
 
 
 # Entrypoint for uvicorn: `uvicorn app.main:app --reload`
@@ -275,20 +551,25 @@ async def _wait_ready(
     host_port: int, health_path: str, timeout_sec: int
 ) -> None:
     """Poll the container through localhost until it returns 200 or timeout."""
-    base = f"http://127.0.0.1:{host_port}"
-    url = urljoin(base + "/", health_path.lstrip("/"))
-    deadline = asyncio.get_event_loop().time() + timeout_sec
-    async with httpx.AsyncClient(follow_redirects=True, timeout=5) as client:
+    url = f"http://127.0.0.1:{host_port}/{health_path.lstrip('/')}"
+    client: httpx.AsyncClient = app.state.http
+
+    async def _probe() -> None:
+        delay = 0.02
         while True:
             try:
-                r = await client.get(url)
+                r = await client.get(url, timeout=5)
                 if 200 <= r.status_code < 300:
                     return
             except Exception:
                 pass
-            if asyncio.get_event_loop().time() >= deadline:
-                raise HTTPException(
-                    status_code=504,
-                    detail="Container did not become ready within timeout",
-                )
-            await asyncio.sleep(0.5)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    try:
+        await asyncio.wait_for(_probe(), timeout_sec)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail="Container did not become ready within timeout",
+        )
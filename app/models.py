@@ -7,6 +7,13 @@ class PullImageRequest(BaseModel):
     image: str = Field(
         ..., description="Docker image reference, e.g. 'nginx:latest'"
     )
+    allow_cached: bool = Field(
+        default=False,
+        description=(
+            "Return the id from a pull or lookup within the last 60s "
+            "without contacting the registry"
+        ),
+    )
 
 
 class ImageInfo(BaseModel):